@@ -1,27 +1,41 @@
 from contextlib import contextmanager
 from collections import namedtuple
-from subprocess import check_output, CalledProcessError
-from os.path import join as p, exists, split as split_path, isdir, isabs
+from functools import lru_cache
+from subprocess import run, CalledProcessError, Popen, PIPE
+from os.path import join as p, exists, isdir, isfile, isabs
 from textwrap import dedent
 import tempfile
 import shutil
 import shlex
+import errno
+import re
+import stat
+import json
+import sys
 import os
 
-from owmeta_core.command import OWM
-from owmeta_core.command_util import DEFAULT_OWM_DIR
-from owmeta_core.bundle import (find_bundle_directory, AccessorConfig, Remote, Fetcher,
-                                retrieve_remote_by_name)
-from owmeta_core.bundle.exceptions import BundleNotFound
-from owmeta_core.bundle.loaders import Loader
-from pkg_resources import resource_stream
 from pytest import fixture, mark
 
+# owmeta_core, pkg_resources, liburing and concurrent.futures are imported only where
+# they're needed: pytest imports this module for every session through our entry point,
+# and importing them would slow the start of every session, including ones that use none
+# of our fixtures
 
 __version__ = '0.0.6'
 
 BundleData = namedtuple('BundleData', ('id', 'version', 'source_directory', 'remote'))
 TEST_BUNDLES_DIRECTORY = os.environ.get('TEST_BUNDLES_DIRECTORY', 'bundles')
+TEST_BUNDLE_LINK = os.environ.get('OWMETA_TEST_BUNDLE_LINK') == '1'
+TEST_BUNDLE_URING = os.environ.get('OWMETA_TEST_BUNDLE_URING') == '1'
+TEST_OWM_SERVER = os.environ.get('OWMETA_TEST_OWM_SERVER') == '1'
+
+_DEFAULT_CONTEXT_ID = 'http://example.org/data'
+
+_LOADER_CACHE = {}
+'''
+Test bundle loaders, remotes, and source directories, keyed by bundles directory, bundle
+ID, version, and fixture name, shared across fixture invocations
+'''
 
 
 def bundle_fixture_helper(bundle_id, version=None):
@@ -42,89 +56,418 @@ def bundle_fixture_helper(bundle_id, version=None):
     function
         A function to pass to `pytest.fixture`
     '''
-    def bundle(request):
-        # Raises a BundleNotFound exception if the bundle can't be found
-        nonlocal version, bundle_id
-        if bundle_id is None and version is None:
+    # The fixture function is chosen here so it doesn't have to work out, on each call,
+    # which of the bundle ID and version come from parameters
+    if bundle_id is None and version is None:
+        def bundle(request):
             try:
-                bundle_id, version = request.param
+                param_bundle_id, param_version = request.param
             except AttributeError as e:
                 raise Exception('Use the bundles decorator to declare bundle'
                         ' versions for this test') from e
-        elif version is None:
+            return _bundle_data(request, param_bundle_id, param_version)
+    elif version is None:
+        def bundle(request):
             try:
-                version = request.param
+                param_version = request.param
             except AttributeError as e:
                 raise Exception('Use the bundle_versions decorator to declare bundle'
                         ' versions for this test') from e
+            return _bundle_data(request, bundle_id, param_version)
+    else:
+        def bundle(request):
+            return _bundle_data(request, bundle_id, version)
+    return bundle
 
-        remotes = []
-        marker = request.node.get_closest_marker("bundle_remote")
-        remote_defined = False
-        test_bundles_remote = marker.args[0] if marker else None
-        if test_bundles_remote:
-            # If there is a Remote defined, try to read it in, either as the file
-            # containing the definition for the Remote...
-            try:
-                with open(test_bundles_remote) as inp:
-                    remote = Remote.read(inp)
-            except FileNotFoundError:
-                # ...or, if we do not find a file with that name, as the name of a previously
-                # configured remote in this project's .owm directory
-                remote = retrieve_remote_by_name(p(DEFAULT_OWM_DIR, 'remotes'), test_bundles_remote)
-                if remote:
-                    remote_defined = True
-                    remotes.append(remote)
-            else:
+
+def _bundle_data(request, bundle_id, version):
+    from owmeta_core.bundle import Remote, retrieve_remote_by_name
+    from owmeta_core.bundle.exceptions import BundleNotFound
+    from owmeta_core.command_util import DEFAULT_OWM_DIR
+
+    # Raises a BundleNotFound exception if the bundle can't be found
+    remotes = []
+    marker = request.node.get_closest_marker("bundle_remote")
+    remote_defined = False
+    test_bundles_remote = marker.args[0] if marker else None
+    if test_bundles_remote:
+        # If there is a Remote defined, try to read it in, either as the file
+        # containing the definition for the Remote...
+        if isfile(test_bundles_remote):
+            with open(test_bundles_remote) as inp:
+                remote = Remote.read(inp)
+            remote_defined = True
+        else:
+            # ...or, if we do not find a file with that name, as the name of a previously
+            # configured remote in this project's .owm directory
+            remote = retrieve_remote_by_name(p(DEFAULT_OWM_DIR, 'remotes'), test_bundles_remote)
+            if remote:
                 remote_defined = True
+                remotes.append(remote)
 
-        TestBundleLoader = None
+    try:
+        source_directory, remote = _test_bundle_remote(request, bundle_id, version)
+    except BundleNotFound:
+        if not remote_defined:
+            raise
+        # Set source_directory to None since it is not really applicable in the case
+        # that the bundle is not maintained statically in the project
+        source_directory = None
+    else:
+        remotes.append(remote)
+
+    return BundleData(
+            bundle_id,
+            version,
+            source_directory,
+            remotes)
+
+
+def _test_bundle_remote(request, bundle_id, version):
+    '''
+    Returns the source directory of the bundle in `TEST_BUNDLES_DIRECTORY` and a remote for
+    loading from it. Raises `BundleNotFound` if the bundle isn't there
+    '''
+    # pytester may change the working directory, so the bundles directory is part of the
+    # key. The remote is named for the fixture, so that is too
+    key = (os.path.abspath(TEST_BUNDLES_DIRECTORY), bundle_id, version, request.fixturename)
+    entry = _LOADER_CACHE.get(key)
+    if entry is None:
+        from owmeta_core.bundle import find_bundle_directory, AccessorConfig, Remote
+        from owmeta_core.bundle.loaders import Loader
+
+        source_directory = find_bundle_directory(TEST_BUNDLES_DIRECTORY, bundle_id, version)
+
+        class TestAC(AccessorConfig):
+            def __eq__(self, other):
+                return other is self
+
+            def __hash__(self):
+                return object.__hash__(self)
+
+        class TestBundleLoader(Loader):
+            def __init__(self, ac):
+                pass
+
+            def bundle_versions(self):
+                return [version]
+
+            @classmethod
+            def can_load_from(cls, ac):
+                if isinstance(ac, TestAC):
+                    return True
+                return False
+
+            def can_load(self, ident, version):
+                return ident == bundle_id and version == version
+
+            def load(self, ident, version):
+                _fast_copytree(source_directory, self.base_directory,
+                        link=TEST_BUNDLE_LINK,
+                        uring=TEST_BUNDLE_URING,
+                        max_workers=_copy_workers())
+
+        TestBundleLoader.register()
+        ac = TestAC()
+        entry = (ac, TestBundleLoader, Remote(f'test_{request.fixturename}', (ac,)),
+                 source_directory)
+        _LOADER_CACHE[key] = entry
+
+        def unregister():
+            del _LOADER_CACHE[key]
+            TestBundleLoader.unregister()
+        # The loader is shared by every test using this bundle version, so it remains
+        # registered until the end of the session
+        request.session.addfinalizer(unregister)
+    return entry[3], entry[2]
+
+
+def _copy_workers():
+    '''
+    The number of threads for copying files, from
+    :envvar:`OWMETA_TEST_BUNDLE_COPY_WORKERS`. Read when needed, rather than on import,
+    so a bad value fails only the tests that copy files
+    '''
+    value = os.environ.get('OWMETA_TEST_BUNDLE_COPY_WORKERS')
+    if value:
         try:
-            source_directory = find_bundle_directory(TEST_BUNDLES_DIRECTORY, bundle_id, version)
-        except BundleNotFound:
-            if not remote_defined:
-                raise
-            # Set source_directory to None since it is not really applicable in the case
-            # that the bundle is not maintained statically in the project
-            source_directory = None
+            workers = int(value)
+        except ValueError:
+            raise ValueError('OWMETA_TEST_BUNDLE_COPY_WORKERS must be an integer number of'
+                    f' threads, not {value!r}') from None
+        if workers:
+            return workers
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+def _copy_file_range(infd, outfd, count):
+    return os.copy_file_range(infd, outfd, count)
+
+
+def _sendfile(infd, outfd, count):
+    return os.sendfile(outfd, infd, None, count)
+
+
+_FILE_COPIERS = tuple(copier for copier, name in ((_copy_file_range, 'copy_file_range'),
+                                                  (_sendfile, 'sendfile'))
+                      if hasattr(os, name))
+'''
+In-kernel file copy functions available on this platform, in order of preference
+'''
+
+_COPY_FALLBACK_ERRNOS = frozenset((errno.EXDEV, errno.ENOTSUP, errno.EOPNOTSUPP,
+                                   errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK))
+
+
+def _fast_copyfile(src, dst, size):
+    '''
+    Copy the `size` bytes of `src` to `dst`, preferring `os.copy_file_range` (which can
+    reflink on filesystems that support it) and `os.sendfile` over `shutil.copyfile`
+    '''
+    infd = os.open(src, os.O_RDONLY)
+    try:
+        outfd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            for copier in _FILE_COPIERS:
+                try:
+                    remaining = size
+                    while remaining > 0:
+                        copied = copier(infd, outfd, remaining)
+                        if not copied:
+                            # Some filesystems make copy_file_range copy nothing rather
+                            # than fail
+                            break
+                        remaining -= copied
+                    if remaining <= 0:
+                        return
+                except OSError as e:
+                    if e.errno not in _COPY_FALLBACK_ERRNOS:
+                        raise
+                # Start over with the next copier
+                os.lseek(infd, 0, os.SEEK_SET)
+                os.lseek(outfd, 0, os.SEEK_SET)
+                os.ftruncate(outfd, 0)
+        finally:
+            os.close(outfd)
+    finally:
+        os.close(infd)
+    shutil.copyfile(src, dst)
+
+
+def _link_file(src, dst):
+    '''
+    Hard link `src` to `dst`, or symlink it if they are on different devices
+    '''
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        os.symlink(os.path.abspath(src), dst)
+
+
+def _copy_file_job(job):
+    src, dst, st = job
+    _fast_copyfile(src, dst, st.st_size)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+
+
+def _link_file_job(job):
+    src, dst, _ = job
+    _link_file(src, dst)
+
+
+def _walk_scandir(root, rel_path=''):
+    '''
+    Yield an ``(os.DirEntry, relative_path)`` for everything under `root`. Each directory
+    comes before its contents. Like `shutil.copytree`, symlinks are followed.
+
+    Using the `os.DirEntry` objects avoids most of the `os.stat` calls that the
+    `os.path` functions would make.
+    '''
+    with os.scandir(root) as entries:
+        for entry in entries:
+            entry_rel_path = p(rel_path, entry.name) if rel_path else entry.name
+            yield entry, entry_rel_path
+            if entry.is_dir():
+                yield from _walk_scandir(entry.path, entry_rel_path)
+
+
+def _make_tree(src, dst, jobs):
+    '''
+    Recreate the directories under `src` in `dst`, and append a ``(src, dst,
+    stat_result)`` tuple to `jobs` for each file that must be copied
+    '''
+    os.makedirs(dst)
+    for entry, rel_path in _walk_scandir(src):
+        dst_path = p(dst, rel_path)
+        if entry.is_dir():
+            os.mkdir(dst_path)
         else:
-            class TestAC(AccessorConfig):
-                def __eq__(self, other):
-                    return other is self
-
-                def __hash__(self):
-                    return object.__hash__(self)
-
-            class TestBundleLoader(Loader):
-                def __init__(self, ac):
-                    pass
-
-                def bundle_versions(self):
-                    return [version]
-
-                @classmethod
-                def can_load_from(cls, ac):
-                    if isinstance(ac, TestAC):
-                        return True
-                    return False
-
-                def can_load(self, ident, version):
-                    return ident == bundle_id and version == version
-
-                def load(self, ident, version):
-                    shutil.copytree(source_directory, self.base_directory)
-            TestBundleLoader.register()
-            remote = Remote(f'test_{request.fixturename}', (TestAC(),))
-            remotes.append(remote)
-
-        yield BundleData(
-                bundle_id,
-                version,
-                source_directory,
-                remotes)
-        if TestBundleLoader:
-            TestBundleLoader.unregister()
-    return bundle
+            jobs.append((entry.path, dst_path, entry.stat()))
+
+
+_URING_MAX_BATCH = 256
+'''
+Maximum number of reads or writes submitted to the io_uring at once
+'''
+
+_URING_MAX_BATCH_BYTES = 64 << 20
+'''
+Maximum number of bytes buffered for one batch of io_uring reads
+'''
+
+_URING_MIN_SINGLE_FILE_SIZE = 1 << 20
+'''
+A single file smaller than this is not worth setting up an io_uring for
+'''
+
+
+@lru_cache(maxsize=1)
+def _liburing():
+    '''
+    The `liburing` module, or `None` if it isn't installed
+    '''
+    try:
+        import liburing
+    except ImportError:
+        return None
+    return liburing
+
+
+def _uring_chunk_size(size):
+    return (16 << 20) if size > (10 << 30) else (64 << 10)
+
+
+def _uring_run(ring, cqe, prepare, items):
+    '''
+    Prepare an SQE for each of `items` with `prepare`, submit them all at once, and
+    return the result for each item in order
+    '''
+    liburing = _liburing()
+    for index, item in enumerate(items):
+        sqe = liburing.io_uring_get_sqe(ring)
+        prepare(sqe, *item)
+        liburing.io_uring_sqe_set_data64(sqe, index)
+    liburing.io_uring_submit(ring)
+    results = [None] * len(items)
+    for _ in range(len(items)):
+        liburing.io_uring_wait_cqe(ring, cqe)
+        entry = cqe[0]
+        index = liburing.io_uring_cqe_get_data64(entry)
+        try:
+            results[index] = entry.res
+        except OSError as e:
+            results[index] = e
+        liburing.io_uring_cqe_seen(ring, entry)
+    for result in results:
+        if isinstance(result, OSError):
+            raise result
+    return results
+
+
+def _uring_copy_batch(ring, cqe, batch):
+    '''
+    For each ``(infd, outfd, buffer, offset)`` in `batch`, fill ``buffer`` from ``infd``,
+    then write it to ``outfd``. Raises `OSError` if a file ends before its buffers are
+    filled
+    '''
+    liburing = _liburing()
+    reads = _uring_run(ring, cqe, liburing.io_uring_prep_read,
+            [(infd, buf, offset) for infd, _, buf, offset in batch])
+    writes = []
+    for (infd, outfd, buf, offset), count in zip(batch, reads):
+        while count < len(buf):
+            data = os.pread(infd, len(buf) - count, offset + count)
+            if not data:
+                raise OSError(errno.EIO, 'File ended before the expected size', infd)
+            buf[count:count + len(data)] = data
+            count += len(data)
+        writes.append((outfd, buf, offset))
+    written = _uring_run(ring, cqe, liburing.io_uring_prep_write, writes)
+    for (outfd, data, offset), count in zip(writes, written):
+        while count < len(data):
+            count += os.pwrite(outfd, data[count:], offset + count)
+
+
+def _uring_copy_files(jobs):
+    '''
+    Copy the files for each ``(src, dst, stat_result)`` in `jobs` with batched io_uring
+    reads and writes
+    '''
+    liburing = _liburing()
+    ring = liburing.Ring()
+    cqe = liburing.Cqe()
+    liburing.io_uring_queue_init(_URING_MAX_BATCH, ring)
+    # File descriptors for files with queued chunks. They're closed once all of those
+    # chunks are written
+    fds = []
+    try:
+        batch = []
+        batch_bytes = 0
+        for src, dst, st in jobs:
+            fds.append(os.open(src, os.O_RDONLY))
+            fds.append(os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666))
+            infd, outfd = fds[-2:]
+            os.fchmod(outfd, stat.S_IMODE(st.st_mode))
+            chunk_size = _uring_chunk_size(st.st_size)
+            for offset in range(0, st.st_size, chunk_size):
+                length = min(chunk_size, st.st_size - offset)
+                batch.append((infd, outfd, bytearray(length), offset))
+                batch_bytes += length
+                if len(batch) == _URING_MAX_BATCH or batch_bytes >= _URING_MAX_BATCH_BYTES:
+                    _uring_copy_batch(ring, cqe, batch)
+                    batch = []
+                    batch_bytes = 0
+                    # Every file before the current one is completely copied now
+                    for fd in fds[:-2]:
+                        os.close(fd)
+                    del fds[:-2]
+        if batch:
+            _uring_copy_batch(ring, cqe, batch)
+    finally:
+        for fd in fds:
+            os.close(fd)
+        liburing.io_uring_queue_exit(ring)
+
+
+def _use_uring(jobs):
+    if not jobs or _liburing() is None:
+        return False
+    return len(jobs) > 1 or jobs[0][2].st_size >= _URING_MIN_SINGLE_FILE_SIZE
+
+
+def _fast_copytree(src, dst, link=False, uring=False, max_workers=1):
+    '''
+    Like `shutil.copytree`, but uses `_fast_copyfile` for copying files and only
+    preserves permission bits. If `link` is true, files are linked with `_link_file`
+    instead of copied. If `uring` is true and `liburing` is installed, files are copied
+    with io_uring. Otherwise, they're copied by up to `max_workers` threads, after all of
+    the directories are created
+    '''
+    jobs = []
+    _make_tree(src, dst, jobs)
+    if uring and not link:
+        try:
+            if _use_uring(jobs):
+                _uring_copy_files(jobs)
+                return
+        except Exception:
+            # io_uring may be unavailable (e.g., disabled by the kernel), the ring may
+            # have failed part way, or the installed liburing may not have the API we
+            # expect, so we redo the copy the slower way
+            pass
+    do_job = _link_file_job if link else _copy_file_job
+    if max_workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            # Consume the results so that any exceptions are raised here
+            for _ in executor.map(do_job, jobs):
+                pass
+    else:
+        for job in jobs:
+            do_job(job)
 
 
 bundle = fixture(bundle_fixture_helper(None))
@@ -139,11 +482,12 @@ def bundles(versions):
 
     Parameters
     ----------
-    versions : list of int
-        Versions of the bundle to test against
+    versions : iterable of tuple
+        Pairs of bundle ID and version of the bundle to test against
     '''
-    return mark.parametrize('bundle', versions,
-            ids=[f'{bundle_id}@{version}' for bundle_id, version in versions], indirect=True)
+    versions = list(versions)
+    ids = [f'{bundle_id}@{version}' for bundle_id, version in versions]
+    return mark.parametrize('bundle', versions, ids=ids, indirect=True)
 
 
 def bundle_versions(fixture_name, versions):
@@ -154,11 +498,12 @@ def bundle_versions(fixture_name, versions):
     ----------
     fixture_name : str
         The name of the fixture to parameterize
-    versions : list of int
+    versions : iterable of int
         Versions of the bundle to test against
     '''
-    return mark.parametrize(fixture_name, versions,
-            ids=[f'{fixture_name}@{v}' for v in versions], indirect=True)
+    versions = list(versions)
+    ids = [f'{fixture_name}@{v}' for v in versions]
+    return mark.parametrize(fixture_name, versions, ids=ids, indirect=True)
 
 
 @fixture
@@ -187,15 +532,39 @@ def owm_project(request):
         yield f
 
 
+@fixture(scope='session')
+def _owm_template_dir():
+    '''
+    A .owm project directory, initialized once per session, for `owm_project` to copy
+    '''
+    from owmeta_core.command_util import DEFAULT_OWM_DIR
+
+    res = Data()
+    try:
+        os.mkdir(res.test_homedir)
+        res.sh(['owm', '-b', 'init', '--default-context-id', _DEFAULT_CONTEXT_ID])
+        res.close()
+        yield p(res.testdir, DEFAULT_OWM_DIR)
+    finally:
+        res.close()
+        shutil.rmtree(res.testdir)
+
+
 def _owm_project_helper(request):
     def f(*args, **kwargs):
+        from owmeta_core.bundle import Fetcher
+        from owmeta_core.command import OWM
+        from owmeta_core.command_util import DEFAULT_OWM_DIR
+
         res = _shell_helper(request, *args, **kwargs)
         try:
-            default_context_id = 'http://example.org/data'
-            res.sh(f'owm -b init --default-context-id "{default_context_id}"')
-
             res.owmdir = p(res.testdir, DEFAULT_OWM_DIR)
-            res.default_context_id = default_context_id
+            # The freshly initialized project is the same for every test, so it's only
+            # made once and copied
+            _fast_copytree(request.getfixturevalue('_owm_template_dir'), res.owmdir,
+                    uring=TEST_BUNDLE_URING,
+                    max_workers=_copy_workers())
+            res.default_context_id = _DEFAULT_CONTEXT_ID
 
             def owm(userdir=None, **kwargs):
                 if 'owmdir' not in kwargs:
@@ -217,6 +586,7 @@ def _owm_project_helper(request):
 
             yield res
         finally:
+            res.close()
             shutil.rmtree(res.testdir)
     return f
 
@@ -231,6 +601,7 @@ def shell_helper(request):
     try:
         yield res
     finally:
+        res.close()
         shutil.rmtree(res.testdir)
 
 
@@ -247,34 +618,74 @@ def shell_helper_with_customizations(request):
         try:
             yield res
         finally:
+            res.close()
             shutil.rmtree(res.testdir)
     return f
 
 
+@lru_cache(maxsize=1)
+def _load_ptcov():
+    from pkg_resources import resource_stream
+
+    with resource_stream('owmeta_pytest_plugin', 'pytest-cov-embed.py') as f:
+        return f.read() + b'\n'
+
+
 def _shell_helper(request, customizations=None):
     res = Data()
-    os.mkdir(res.test_homedir)
+    os.makedirs(res.test_homedir, exist_ok=True)
 
     # Am I *supposed* to use _cov to detect pytest-cov installation? Maybe... maybe
     # not....
     pm = request.config.pluginmanager
     if pm.hasplugin('_cov'):
-        with resource_stream('owmeta_pytest_plugin', 'pytest-cov-embed.py') as f:
-            ptcov = f.read()
         # Added so pytest_cov gets to run for our subprocesses
-        with open(p(res.testdir, 'sitecustomize.py'), 'wb') as f:
-            f.write(ptcov)
-            f.write(b'\n')
+        fd = os.open(p(res.testdir, 'sitecustomize.py'),
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            data = memoryview(_load_ptcov())
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
 
     def apply_customizations():
         if customizations:
+            # A running owm server would not see the new customizations
+            res.close()
             with open(p(res.testdir, 'sitecustomize.py'), 'a') as f:
-                f.write(dedent(customizations))
+                f.write(_dedent(customizations))
 
     res.apply_customizations = apply_customizations
     return res
 
 
+_INDENTED_LINE = re.compile(r'^[ \t]', re.M)
+
+
+def _dedent(text):
+    '''
+    `textwrap.dedent`, but skipped when no line of `text` starts with whitespace, since
+    then there is neither indentation to remove nor a whitespace-only line to normalize
+    '''
+    if not _INDENTED_LINE.search(text):
+        return text
+    return dedent(text)
+
+
+def _command_string(command):
+    if isinstance(command, (list, tuple)):
+        return ' '.join(shlex.quote(arg) for arg in command)
+    return command
+
+
+_OUTPUT_BANNER = '''\
+----------{1} from "{0}"----------
+{2}
+----------{3}----------
+'''
+
+
 @fixture(scope='session', autouse=True)
 def owmeta_ep_cache():
     with tempfile.TemporaryDirectory(prefix=f'{__name__}.ep_cache.') as tempdir:
@@ -297,6 +708,10 @@ class Data(object):
 
     exception = None
 
+    _owm_server = None
+
+    _owm_server_env = None
+
     def __init__(self):
         self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
         self.test_homedir = p(self.testdir, 'homedir')
@@ -320,10 +735,13 @@ class Data(object):
         dest : str
             Target directory. Will be interpreted relative to `testdir`
         '''
+        target = p(self.testdir, dest)
         if isdir(source):
-            return shutil.copytree(source, p(self.testdir, dest))
+            _fast_copytree(source, target, uring=TEST_BUNDLE_URING,
+                    max_workers=_copy_workers())
+            return target
         else:
-            return shutil.copy(source, p(self.testdir, dest))
+            return shutil.copy(source, target)
 
     def make_module(self, module):
         '''
@@ -345,14 +763,9 @@ class Data(object):
             raise ValueError('Must use a relative path. Given ' + str(module))
         modpath = p(self.testdir, module)
         os.makedirs(modpath)
-        last_dname = None
-        dname = modpath
-        while last_dname != dname and dname != self.testdir:
-            open(p(dname, '__init__.py'), 'x').close()
-            base = ''
-            while not base and last_dname != dname:
-                last_dname = dname
-                dname, base = split_path(modpath)
+        parts = os.path.normpath(module).split(os.sep)
+        for depth in range(1, len(parts) + 1):
+            open(p(self.testdir, *parts[:depth], '__init__.py'), 'a').close()
 
         return modpath
 
@@ -380,11 +793,11 @@ class Data(object):
             if exists(contents):
                 print(open(contents).read(), file=f)
             else:
-                print(dedent(contents), file=f)
+                print(_dedent(contents), file=f)
             f.flush()
         return fname
 
-    def sh(self, *command, **kwargs):
+    def sh(self, *command, batch=False, capture=True, owm_server=None, **kwargs):
         '''
         Execute commands with the working directory set to `testdir`, the
         :envvar:`HOME` environment variable set to `test_homedir`, and with `testdir`
@@ -392,47 +805,134 @@ class Data(object):
 
         Parameters
         ----------
-        *command : list of str
-            Command or commands to execute
+        *command : list of str or list of list of str
+            Command or commands to execute. Each command is either a string, which is split
+            into arguments with `shlex.split`, or an already split sequence of arguments
+        batch : bool, optional
+            If true and more than one command is given, the commands are joined with
+            ``&&`` and executed by a single :program:`/bin/sh` process, and their
+            combined output is returned as one string
+        capture : bool, optional
+            If false, the output of the commands is not captured, and an empty string is
+            returned for each command
+        owm_server : bool, optional
+            If true, ``owm`` commands whose output is captured, and which are given no
+            additional arguments for `subprocess.run`, are executed by a long-lived
+            process that keeps owmeta_core imported, rather than each by a new
+            :program:`owm` process. Commands executed this way share one interpreter, so
+            modules imported by one command, including ones from `testdir`, are not
+            re-imported for later commands even if they have changed since, and any
+            module-level state is kept between commands. Defaults to true if the
+            :envvar:`OWMETA_TEST_OWM_SERVER` environment variable is set to ``1``, and
+            false otherwise
         **kwargs : dict
-            Additional arguments to `subprocess.check_output`
+            Additional arguments to `subprocess.run`
 
         Returns
         -------
         str or list of str
-            Output of the given command. See `subprocess.check_output` for details on
-            return values and how they are affected by arguments to that function.
+            Output of the given command, decoded as UTF-8. See `subprocess.run` for
+            details on how this is affected by arguments to that function.
         '''
         if not command:
             return None
-        env = dict(os.environ)
-        env['PYTHONPATH'] = self.testdir + ((os.pathsep + env['PYTHONPATH'])
-                                            if 'PYTHONPATH' in env
-                                            else '')
-        env['HOME'] = self.test_homedir
-        env.update(kwargs.pop('env', {}))
+        extra_env = kwargs.pop('env', None)
+        env = self._env(extra_env)
+        if batch and len(command) > 1:
+            joined = ' && '.join(_command_string(cmd) for cmd in command)
+            runs = [(joined, ['/bin/sh', '-c', joined])]
+        else:
+            runs = [(_command_string(cmd), cmd) if isinstance(cmd, (list, tuple))
+                    else (cmd, shlex.split(cmd))
+                    for cmd in command]
+        if owm_server is None:
+            owm_server = TEST_OWM_SERVER
+        use_owm_server = owm_server and capture and not kwargs and not extra_env
+        if capture:
+            kwargs.setdefault('stdout', PIPE)
+            kwargs.setdefault('stderr', PIPE)
         outputs = []
-        for cmd in command:
+        for cmd, args in runs:
             try:
-                outputs.append(check_output(shlex.split(cmd), env=env, cwd=self.testdir, **kwargs).decode('utf-8'))
+                if use_owm_server and args and args[0] == 'owm':
+                    outputs.append(self._owm_server_call(args, env))
+                else:
+                    outputs.append(self._run(args, env, **kwargs))
             except CalledProcessError as e:
                 if e.output:
-                    print(dedent('''\
-                    ----------stdout from "{}"----------
-                    {}
-                    ----------{}----------
-                    ''').format(cmd.strip(), e.output.decode('UTF-8'),
-                               'end stdout'.center(14 + len(cmd))))
+                    print(_OUTPUT_BANNER.format(cmd.strip(), 'stdout', e.output,
+                                                'end stdout'.center(14 + len(cmd))))
                 if getattr(e, 'stderr', None):
-                    print(dedent('''\
-                    ----------stderr from "{}"----------
-                    {}
-                    ----------{}----------
-                    ''').format(cmd.strip(), e.stderr.decode('UTF-8'),
-                               'end stderr'.center(14 + len(cmd))))
+                    print(_OUTPUT_BANNER.format(cmd.strip(), 'stderr', e.stderr,
+                                                'end stderr'.center(14 + len(cmd))))
                 raise
         return outputs[0] if len(outputs) == 1 else outputs
 
+    def _env(self, extra_env=None):
+        '''
+        The environment for `sh`: the current `os.environ`, with our :envvar:`HOME` and
+        :envvar:`PYTHONPATH`, updated with `extra_env`
+        '''
+        env = dict(os.environ, HOME=self.test_homedir)
+        pythonpath = env.get('PYTHONPATH')
+        env['PYTHONPATH'] = self.testdir + (os.pathsep + pythonpath if pythonpath else '')
+        if extra_env:
+            env.update(extra_env)
+        return env
+
+    def _run(self, args, env, **kwargs):
+        # subprocess can't use posix_spawn with `cwd`, and os.posix_spawn has no way to
+        # change the directory, but on Linux with Python 3.10+ subprocess uses vfork
+        # anyway, which likewise avoids copying this process's page tables
+        return run(args, env=env, cwd=self.testdir, check=True,
+                encoding='utf-8', errors='replace', **kwargs).stdout or ''
+
+    def _owm_server_call(self, args, env):
+        if self._owm_server is not None and env != self._owm_server_env:
+            # The server can't see a changed environment, so we start a new one
+            self.close()
+        server = self._owm_server
+        if server is None:
+            server = Popen([sys.executable, '-u', '-m', 'owmeta_pytest_plugin.owm_server'],
+                    stdin=PIPE, stdout=PIPE, env=env, cwd=self.testdir)
+            self._owm_server = server
+            self._owm_server_env = env
+        try:
+            server.stdin.write(json.dumps({'args': args[1:]}).encode('utf-8') + b'\n')
+            server.stdin.flush()
+        except BrokenPipeError:
+            # The server had exited before it got the command, so we just run it ourselves
+            self.close()
+            return self._run(args, env, stdout=PIPE, stderr=PIPE)
+        response = server.stdout.readline()
+        if not response:
+            # The server exited while running the command. Running it again could repeat
+            # whatever it had done, so this is treated like the command failing
+            self.close()
+            raise CalledProcessError(server.returncode, args)
+        response = json.loads(response)
+        if response['returncode']:
+            raise CalledProcessError(response['returncode'], args,
+                    output=response['stdout'],
+                    stderr=response['stderr'])
+        return response['stdout']
+
+    def close(self):
+        '''
+        Stop the process started by `sh` for executing ``owm`` commands, if there is one
+        '''
+        server = self._owm_server
+        if server is None:
+            return
+        self._owm_server = None
+        self._owm_server_env = None
+        try:
+            server.stdin.close()
+        except BrokenPipeError:
+            pass
+        server.stdout.close()
+        server.wait()
+
     __repr__ = __str__
 
 
@@ -0,0 +1,95 @@
+'''
+Long-lived process for executing ``owm`` commands on behalf of `~owmeta_pytest_plugin.Data.sh`
+
+Executing each ``owm`` command in a new process means importing owmeta_core each time.
+This module keeps it imported: it reads one JSON request per line from stdin, each of
+the form ``{"args": [...]}`` with the arguments that would follow ``owm`` on the command
+line, and writes one JSON response per line to stdout of the form ``{"stdout": ...,
+"stderr": ..., "returncode": ...}``.
+
+So that commands behave as they would in their own process, everything written to file
+descriptors 1 and 2 while a command runs, including by logging and by sub-processes, is
+captured for the response, and commands get :file:`/dev/null` rather than the requests as
+their standard input.
+'''
+from contextlib import contextmanager
+import logging
+import tempfile
+import json
+import sys
+import os
+import traceback
+
+
+def run(args):
+    from owmeta_core.cli import main
+
+    returncode = 0
+    saved_argv = sys.argv
+    sys.argv = ['owm'] + list(args)
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        with _redirect_fd(1, out.fileno(), sys.stdout), \
+                _redirect_fd(2, err.fileno(), sys.stderr):
+            try:
+                main()
+            except SystemExit as e:
+                if e.code is None:
+                    returncode = 0
+                elif isinstance(e.code, int):
+                    returncode = e.code
+                else:
+                    print(e.code, file=sys.stderr)
+                    returncode = 1
+            except Exception:
+                traceback.print_exc()
+                returncode = 1
+            finally:
+                sys.argv = saved_argv
+        return dict(stdout=_read(out), stderr=_read(err), returncode=returncode)
+
+
+@contextmanager
+def _redirect_fd(fd, target_fd, stream):
+    '''
+    Point file descriptor `fd` at `target_fd`, flushing `stream`, which writes to `fd`,
+    before and after
+    '''
+    stream.flush()
+    saved_fd = os.dup(fd)
+    os.dup2(target_fd, fd)
+    try:
+        yield
+    finally:
+        stream.flush()
+        os.dup2(saved_fd, fd)
+        os.close(saved_fd)
+
+
+def _read(f):
+    f.seek(0)
+    return f.read().decode('utf-8', errors='replace')
+
+
+def serve():
+    # Keep the real stdin and stdout for requests and responses. Between commands,
+    # anything written directly to file descriptor 1 goes to stderr instead so it can't
+    # corrupt the responses
+    requests = os.fdopen(os.dup(0), 'r')
+    responses = os.fdopen(os.dup(1), 'w')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+    # `main` calls this too, but we want the handler in place before sys.stderr could be
+    # replaced. It writes to file descriptor 2, so log output is captured with the rest
+    logging.basicConfig()
+    with requests, responses:
+        for line in requests:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            print(json.dumps(run(request['args'])), file=responses, flush=True)
+
+
+if __name__ == '__main__':
+    serve()
@@ -1,71 +1,216 @@
-from io import StringIO
-import shutil
+from subprocess import CalledProcessError
 from pathlib import Path
+from textwrap import dedent, indent
+import importlib
+import errno
+import sys
 import os
 
 import pytest
-from owmeta_core.bundle import Remote
-from owmeta_core.bundle.common import BUNDLE_MANIFEST_FILE_NAME
-from owmeta_core.bundle.loaders.local import FileURLConfig
 
+import owmeta_pytest_plugin
 from owmeta_pytest_plugin import bundles, bundle_versions, bundle_fixture_helper
 
 
-# Save the CWD since pytester changes it
-CWD = os.getcwd()
+_CUSTOM_SRC = dedent('''\
+    import os
+    os.environ['HEY_LOOK_AT_ME'] = "I'm Mr. Meeseeks"
+    ''')
+
+
+def _runpytest(pytester):
+    '''
+    Run pytest in this process, loading only our plugin, to skip starting another
+    interpreter and searching for every installed plugin
+    '''
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('PYTEST_DISABLE_PLUGIN_AUTOLOAD', '1')
+        return pytester.runpytest_inprocess('-p', 'no:cacheprovider',
+                '-p', 'owmeta_core_fixtures')
 
 
 def test_sh_multiple_commands(shell_helper):
-    assert len(shell_helper.sh('python', 'python')) == 2
+    assert len(shell_helper.sh('true', 'true')) == 2
 
 
-def test_sh_with_customizations(shell_helper_with_customizations):
-    with shell_helper_with_customizations(customizations='''
-    import os
-    os.environ['HEY_LOOK_AT_ME'] = "I'm Mr. Meeseeks"
-    ''') as shell_helper:
+def test_sh_batch(shell_helper):
+    assert shell_helper.sh('echo a', 'echo b', batch=True) == 'a\nb\n'
+
+
+def test_sh_split_command(shell_helper):
+    assert shell_helper.sh(['echo', 'a  b']) == 'a  b\n'
+
+
+def test_sh_env_set_after_creation(shell_helper, monkeypatch):
+    monkeypatch.setenv('FOO_LATE', 'yes')
+    assert shell_helper.sh('sh -c "echo $FOO_LATE"') == 'yes\n'
+
+
+@pytest.mark.parametrize('customizations', [_CUSTOM_SRC, '\n' + indent(_CUSTOM_SRC, '    ')],
+        ids=['dedented', 'indented'])
+def test_sh_with_customizations(shell_helper_with_customizations, customizations):
+    with shell_helper_with_customizations(customizations=customizations) as shell_helper:
         shell_helper.apply_customizations()
         cmd = r'python -c "import os ; print(os.environ[\"HEY_LOOK_AT_ME\"])"'
         assert shell_helper.sh(cmd).strip() == "I'm Mr. Meeseeks"
 
 
+def test_sh_coverage_sitecustomize_short_writes(shell_helper_with_customizations,
+        monkeypatch, request):
+    if not request.config.pluginmanager.hasplugin('_cov'):
+        pytest.skip('Needs pytest-cov to be collecting coverage')
+    write = os.write
+    monkeypatch.setattr(os, 'write', lambda fd, data: write(fd, data[:10]))
+    with shell_helper_with_customizations() as shell_helper:
+        sitecustomize = Path(shell_helper.testdir, 'sitecustomize.py')
+        assert sitecustomize.read_bytes() == owmeta_pytest_plugin._load_ptcov()
+
+
+@pytest.mark.parametrize('owm_server', [False, True], ids=['owm', 'owm_server'])
+def test_sh_owm_failure(shell_helper, owm_server):
+    with pytest.raises(CalledProcessError):
+        shell_helper.sh('owm not-a-command', owm_server=owm_server)
+
+
+def test_sh_owm_matches_subprocess(shell_helper):
+    expected = shell_helper.sh('owm --help', owm_server=False)
+    assert shell_helper._owm_server is None
+    assert shell_helper.sh('owm --help', owm_server=True) == expected
+    assert shell_helper._owm_server is not None
+
+
+def test_sh_owm_server_restarted_for_new_env(shell_helper, monkeypatch):
+    shell_helper.sh('owm --help', owm_server=True)
+    server = shell_helper._owm_server
+    monkeypatch.setenv('FOO_LATE', 'yes')
+    shell_helper.sh('owm --help', owm_server=True)
+    assert shell_helper._owm_server not in (None, server)
+
+
+def test_sh_owm_server_exits_during_command(shell_helper):
+    # Shadows the real owmeta_core for the server, which imports from `testdir`
+    shell_helper.make_module('owmeta_core')
+    shell_helper.writefile('owmeta_core/cli.py', '''
+    import os
+
+    def main():
+        with open('runs', 'a') as f:
+            print('run', file=f)
+        os._exit(3)
+    ''')
+    with pytest.raises(CalledProcessError) as excinfo:
+        shell_helper.sh('owm save something', owm_server=True)
+    assert excinfo.value.returncode == 3
+    assert Path(shell_helper.testdir, 'runs').read_text() == 'run\n'
+
+
+def test_sh_owm_sees_changed_module(shell_helper, monkeypatch):
+    monkeypatch.setattr(owmeta_pytest_plugin, 'TEST_OWM_SERVER', False)
+    # Shadows the real owmeta_core for `owm`, which imports from `testdir`
+    shell_helper.make_module('owmeta_core')
+    shell_helper.writefile('owmeta_core/cli.py', '''
+    def main():
+        import mymod
+        print(mymod.VALUE)
+    ''')
+    shell_helper.writefile('mymod.py', 'VALUE = 1')
+    assert shell_helper.sh('owm save mymod') == '1\n'
+    # A different length, so the changed module can't be mistaken for the cached one
+    shell_helper.writefile('mymod.py', 'VALUE = 22')
+    assert shell_helper.sh('owm save mymod') == '22\n'
+
+
 def test_owm_project_owmdir(owm_project):
     owm = owm_project.owm()
-    assert owm.owmdir.startswith(owm_project.testdir)
+    assert Path(owm.owmdir).is_relative_to(owm_project.testdir)
 
 
+@pytest.mark.xdist_group('bundles')
 @bundles([('example/aBundle', 23)])
 def test_owm_project_fetch_bundle(owm_project, bundle):
     bundle_dir = owm_project.fetch(bundle)
-    assert bundle_dir.startswith(owm_project.testdir)
+    assert Path(bundle_dir).is_relative_to(owm_project.testdir)
 
 
 example_bundle = pytest.fixture(bundle_fixture_helper('example/aBundle'))
 
 
+@pytest.mark.xdist_group('bundles')
 @bundle_versions('example_bundle', [23])
 def test_bundle_versions(example_bundle):
     assert example_bundle.remote is not None
 
 
-def test_remote_bundle(pytester):
+@pytest.mark.xdist_group('bundles')
+def test_bundle_remote_named_for_fixture(request):
+    class FixtureRequest(object):
+        session = request.session
+
+        def __init__(self, fixturename):
+            self.fixturename = fixturename
+
+    remote_names = [owmeta_pytest_plugin._test_bundle_remote(FixtureRequest(name),
+                        'example/aBundle', 23)[1].name
+                    for name in ('bundle', 'example_bundle')]
+    assert remote_names == ['test_bundle', 'test_example_bundle']
+
+
+@pytest.fixture
+def _fake_bundle_data(monkeypatch):
+    def bundle_data(request, bundle_id, version):
+        return owmeta_pytest_plugin.BundleData(bundle_id, version, None, [])
+    monkeypatch.setattr(owmeta_pytest_plugin, '_bundle_data', bundle_data)
+
+
+_any_bundle = bundle_fixture_helper(None)
+_versioned_bundle = bundle_fixture_helper('example/aBundle')
+
+
+@pytest.fixture
+def any_bundle(request, _fake_bundle_data):
+    return _any_bundle(request)
+
+
+@pytest.fixture
+def versioned_bundle(request, _fake_bundle_data):
+    return _versioned_bundle(request)
+
+
+@pytest.mark.parametrize('any_bundle', [('example/aBundle', 23), ('example/bBundle', 24)],
+        indirect=True)
+def test_bundle_fixture_params(any_bundle, request):
+    assert (any_bundle.id, any_bundle.version) == request.node.callspec.params['any_bundle']
+
+
+@bundle_versions('versioned_bundle', [23, 24])
+def test_bundle_fixture_versions(versioned_bundle, request):
+    assert versioned_bundle.id == 'example/aBundle'
+    assert versioned_bundle.version == request.node.callspec.params['versioned_bundle']
+
+
+@pytest.mark.xdist_group('bundles')
+def test_remote_bundle(pytester, remote_bundles_src):
+    from owmeta_core.bundle import Remote
+    from owmeta_core.bundle.loaders.local import FileURLConfig
+
     # Set up a remote
     remote = Remote('test', (FileURLConfig(f'file://{pytester.path}/remote-bundles'),))
-    sio = StringIO()
-    remote.write(sio)
-    pytester.makefile('.remote', test=sio.getvalue())
+    with (pytester.path / 'test.remote').open('w') as out:
+        remote.write(out)
 
     # Set up the test that will be run
     pytester.copy_example('bundle_remote_test.py')
 
-    # Copy the bundle(s) we use in the test
-    shutil.copytree(Path(CWD, 'bundles'), Path(pytester.path, 'remote-bundles'))
+    # Link to the bundle(s) we use in the test
+    (pytester.path / 'remote-bundles').symlink_to(remote_bundles_src,
+            target_is_directory=True)
 
     # Run the test, asserting that one test passes and none fail (implicit)
-    pytester.runpytest().assert_outcomes(passed=1)
+    _runpytest(pytester).assert_outcomes(passed=1)
 
 
-def test_remote_bundle_by_name(pytester):
+@pytest.mark.xdist_group('bundles')
+def test_remote_bundle_by_name(pytester, remote_bundles_src):
     # Set up a remote
     pytester.run('owm', 'bundle', 'remote', 'add', 'test',
             f'file://{pytester.path}/remote-bundles')
@@ -73,19 +218,30 @@ def test_remote_bundle_by_name(pytester):
     # Set up the test that will be run
     pytester.copy_example('bundle_remote_by_name_test.py')
 
-    # Copy the bundle(s) we use in the test
-    shutil.copytree(Path(CWD, 'bundles'), Path(pytester.path, 'remote-bundles'))
+    # Link to the bundle(s) we use in the test
+    (pytester.path / 'remote-bundles').symlink_to(remote_bundles_src,
+            target_is_directory=True)
 
     # Run the test, asserting that one test passes and none fail (implicit)
-    pytester.runpytest().assert_outcomes(passed=1)
+    _runpytest(pytester).assert_outcomes(passed=1)
 
 
-def test_writefile_file(shell_helper):
-    shell_helper.writefile('setup.py')
+@pytest.mark.parametrize('args', [('setup.py',), ('some.txt', 'some stuff in a file')],
+        ids=['file', 'from_string'])
+def test_writefile(shell_helper, args):
+    shell_helper.writefile(*args)
 
 
-def test_writefile_from_string(shell_helper):
-    shell_helper.writefile('some.txt', 'some stuff in a file')
+@pytest.mark.parametrize('text', [
+    'a\nb\n',
+    '\n    a\n      b\n',
+    'a\n   \nb\n',
+    '\n\n  a\nb\n',
+    '\ta\n\tb',
+    '',
+])
+def test_dedent_matches_textwrap(text):
+    assert owmeta_pytest_plugin._dedent(text) == dedent(text)
 
 
 def test_make_module_fail(shell_helper):
@@ -93,14 +249,168 @@ def test_make_module_fail(shell_helper):
         shell_helper.make_module('/abs/not/okay')
 
 
-def test_make_module(shell_helper):
+def test_make_module(shell_helper, monkeypatch):
     shell_helper.make_module('my/good/module')
-    shell_helper.sh('python -c "import my.good.module"')
+    # Imported here rather than with `sh` to skip starting another interpreter
+    monkeypatch.syspath_prepend(shell_helper.testdir)
+    try:
+        importlib.import_module('my.good.module')
+    finally:
+        for name in ('my.good.module', 'my.good', 'my'):
+            sys.modules.pop(name, None)
+
+
+def test_make_module_intermediate_packages(shell_helper):
+    shell_helper.make_module('my/good/module')
+    assert Path(shell_helper.testdir, 'my', '__init__.py').exists()
+    assert Path(shell_helper.testdir, 'my', 'good', '__init__.py').exists()
 
 
 def test_copy_file(shell_helper):
-    assert shell_helper.copy('setup.py', 'target').startswith(shell_helper.testdir)
+    target = shell_helper.copy('setup.py', 'target')
+    assert Path(target).is_relative_to(shell_helper.testdir)
 
 
 def test_copy_dir(shell_helper):
-    assert shell_helper.copy('tests', 'more-tests').startswith(shell_helper.testdir)
+    target = shell_helper.copy('tests', 'more-tests')
+    assert Path(target).is_relative_to(shell_helper.testdir)
+
+
+def _copy_nothing(infd, outfd, count):
+    return 0
+
+
+@pytest.mark.parametrize('copiers',
+        [(_copy_nothing,) + owmeta_pytest_plugin._FILE_COPIERS, (_copy_nothing,)],
+        ids=['next_copier', 'copyfile'])
+def test_fast_copyfile_copier_copies_nothing(tmp_path, monkeypatch, copiers):
+    src = tmp_path / 'src'
+    src.write_bytes(os.urandom(1000))
+    monkeypatch.setattr(owmeta_pytest_plugin, '_FILE_COPIERS', copiers)
+    owmeta_pytest_plugin._fast_copyfile(src, tmp_path / 'dst', 1000)
+    assert (tmp_path / 'dst').read_bytes() == src.read_bytes()
+
+
+def _make_sample_tree(root):
+    '''
+    Make a directory tree with files of various sizes, including ones spanning several
+    io_uring chunks, for testing copies
+    '''
+    (root / 'sub' / 'deeper').mkdir(parents=True)
+    (root / 'empty').write_bytes(b'')
+    (root / 'small').write_bytes(os.urandom(100))
+    (root / 'sub' / 'chunks').write_bytes(os.urandom((200 << 10) + 1))
+    for i in range(20):
+        (root / 'sub' / 'deeper' / f'f{i}').write_bytes(os.urandom(i * 1000))
+    return root
+
+
+def _assert_same_tree(expected, actual):
+    expected_files = sorted(p.relative_to(expected) for p in expected.rglob('*'))
+    assert expected_files == sorted(p.relative_to(actual) for p in actual.rglob('*'))
+    for rel_path in expected_files:
+        if (expected / rel_path).is_file():
+            assert (actual / rel_path).read_bytes() == (expected / rel_path).read_bytes()
+
+
+def test_uring_copy_files(tmp_path):
+    pytest.importorskip('liburing')
+    src = _make_sample_tree(tmp_path / 'src')
+    jobs = []
+    owmeta_pytest_plugin._make_tree(src, tmp_path / 'dst', jobs)
+    owmeta_pytest_plugin._uring_copy_files(jobs)
+    _assert_same_tree(src, tmp_path / 'dst')
+
+
+def test_uring_copy_files_short_reads(tmp_path, monkeypatch):
+    liburing = pytest.importorskip('liburing')
+    uring_run = owmeta_pytest_plugin._uring_run
+
+    def short_reads(ring, cqe, prepare, items):
+        results = uring_run(ring, cqe, prepare, items)
+        if prepare is liburing.io_uring_prep_read:
+            results = [count // 2 for count in results]
+        return results
+
+    monkeypatch.setattr(owmeta_pytest_plugin, '_uring_run', short_reads)
+    src = _make_sample_tree(tmp_path / 'src')
+    jobs = []
+    owmeta_pytest_plugin._make_tree(src, tmp_path / 'dst', jobs)
+    owmeta_pytest_plugin._uring_copy_files(jobs)
+    _assert_same_tree(src, tmp_path / 'dst')
+
+
+def test_uring_copy_files_early_eof(tmp_path):
+    pytest.importorskip('liburing')
+    src = _make_sample_tree(tmp_path / 'src')
+    jobs = []
+    owmeta_pytest_plugin._make_tree(src, tmp_path / 'dst', jobs)
+    # The file shrinks after it was listed for copying
+    (src / 'small').write_bytes(b'')
+    with pytest.raises(OSError):
+        owmeta_pytest_plugin._uring_copy_files(jobs)
+
+
+def test_fast_copytree_uring_failure_falls_back(tmp_path, monkeypatch):
+    def fail(jobs):
+        raise AttributeError('io_uring_sqe_set_data64')
+
+    monkeypatch.setattr(owmeta_pytest_plugin, '_liburing', lambda: object())
+    monkeypatch.setattr(owmeta_pytest_plugin, '_uring_copy_files', fail)
+    src = _make_sample_tree(tmp_path / 'src')
+    owmeta_pytest_plugin._fast_copytree(src, tmp_path / 'dst', uring=True)
+    _assert_same_tree(src, tmp_path / 'dst')
+
+
+def test_fast_copytree_link(tmp_path):
+    src = _make_sample_tree(tmp_path / 'src')
+    owmeta_pytest_plugin._fast_copytree(src, tmp_path / 'dst', link=True)
+    _assert_same_tree(src, tmp_path / 'dst')
+    for path in src.rglob('*'):
+        if path.is_file():
+            assert (tmp_path / 'dst' / path.relative_to(src)).stat().st_ino == \
+                    path.stat().st_ino
+
+
+def test_fast_copytree_link_other_device(tmp_path, monkeypatch):
+    def link(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, 'link', link)
+    src = _make_sample_tree(tmp_path / 'src')
+    owmeta_pytest_plugin._fast_copytree(src, tmp_path / 'dst', link=True)
+    _assert_same_tree(src, tmp_path / 'dst')
+    for path in src.rglob('*'):
+        if path.is_file():
+            target = tmp_path / 'dst' / path.relative_to(src)
+            assert target.is_symlink()
+            assert os.readlink(target) == os.path.abspath(path)
+
+
+def test_fast_copytree_threads(tmp_path, monkeypatch):
+    import concurrent.futures
+
+    executors = []
+
+    class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            executors.append(self)
+
+    monkeypatch.setattr(concurrent.futures, 'ThreadPoolExecutor', RecordingExecutor)
+    monkeypatch.setattr(owmeta_pytest_plugin, '_liburing', lambda: None)
+    src = _make_sample_tree(tmp_path / 'src')
+    owmeta_pytest_plugin._fast_copytree(src, tmp_path / 'dst', uring=True, max_workers=4)
+    _assert_same_tree(src, tmp_path / 'dst')
+    assert executors
+
+
+def test_copy_workers(monkeypatch):
+    monkeypatch.setenv('OWMETA_TEST_BUNDLE_COPY_WORKERS', '3')
+    assert owmeta_pytest_plugin._copy_workers() == 3
+
+
+def test_copy_workers_invalid(monkeypatch):
+    monkeypatch.setenv('OWMETA_TEST_BUNDLE_COPY_WORKERS', 'lots')
+    with pytest.raises(ValueError, match='OWMETA_TEST_BUNDLE_COPY_WORKERS'):
+        owmeta_pytest_plugin._copy_workers()
@@ -1 +1,87 @@
+from pathlib import Path
+import tempfile
+import shutil
+import os
+
+import pytest
+
 pytest_plugins = ["pytester"]
+
+
+def _tree_signature(root):
+    '''
+    A cheap stand-in for a hash of the tree under `root`: the latest modification time,
+    the total size of files, and the number of entries
+    '''
+    max_mtime = 0
+    total_size = 0
+    count = 0
+    dirs = [root]
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                st = entry.stat()
+                max_mtime = max(max_mtime, st.st_mtime_ns)
+                count += 1
+                if entry.is_dir():
+                    dirs.append(entry.path)
+                else:
+                    total_size += st.st_size
+    return [max_mtime, total_size, count]
+
+
+def _cached_copy(src, cache_dir):
+    '''
+    Return a copy of `src` in `cache_dir`, reusing an earlier one if neither `src` nor the
+    copy has changed since it was made
+
+    `shutil.copytree` keeps modification times, so an unchanged copy has the same
+    signature as its source. The copy is made under a temporary name and renamed into
+    place, so concurrent sessions don't see one another's partial copies.
+    '''
+    signature = _tree_signature(src)
+    name = '-'.join(str(x) for x in signature)
+    dst = cache_dir / name
+    if dst.is_dir() and _tree_signature(dst) == signature:
+        return dst
+
+    tmp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir))
+    try:
+        shutil.copytree(src, tmp / name)
+        if dst.is_dir():
+            # The copy was changed. We move it aside since it can't be replaced in one step
+            try:
+                os.rename(dst, tmp / 'changed')
+            except FileNotFoundError:
+                pass
+        try:
+            os.rename(tmp / name, dst)
+        except OSError:
+            # Another session put its copy in place first
+            pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Copies of earlier versions of `src` will not be used again
+    for entry in cache_dir.iterdir():
+        if entry.name != name and not entry.name.startswith('.tmp-'):
+            shutil.rmtree(entry, ignore_errors=True)
+    return dst
+
+
+@pytest.fixture(scope='session')
+def remote_bundles_src(request, tmp_path_factory):
+    '''
+    A copy of the project's test bundles for tests to link to from their own remote
+    bundle directories
+
+    The copy is kept in the pytest cache and only re-made when the bundles or the copy
+    change. Without the cache, it's made once per session.
+    '''
+    src = request.config.rootpath / 'bundles'
+    cache = getattr(request.config, 'cache', None)
+    if cache is None:
+        dst = tmp_path_factory.mktemp('remote-bundles-src') / 'bundles'
+        shutil.copytree(src, dst)
+        return dst
+    return _cached_copy(src, cache.mkdir('remote-bundles-src'))